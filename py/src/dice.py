@@ -1,10 +1,12 @@
 # Dicerolling.
 # Parser and evaluator for dice roll inputs.
 
+import functools
 import logging
+import operator
 import re
 import typing
-from math import ceil, factorial, floor, perm, sqrt
+from math import ceil, comb, factorial, floor, perm, sqrt
 
 from dice_details import *
 from utils import codeblock, escape
@@ -27,12 +29,16 @@ KEYWORDS = [
 KEYWORD_PATTERN = "|".join(KEYWORDS)
 MACRO_PATTERN = r"\$[\w]+"
 MACRO_DEPTH_CAP = 10
+# Factorials looked up instead of recomputed by _factorial_operator.
+FACTORIAL_TABLE = tuple(factorial(i) for i in range(171))
 
 # fmt: off
 TOKEN_SPEC = [
-    ("LABEL",    r"\[.*?\]|#.*"),               # Labels, tags, comments
+    ("LABEL",    r"\[[^\]\n]*\]"),              # Labels, tags
+    ("COMMENT",  r"#.*"),                       # Comments
     ("MACRO",    MACRO_PATTERN),                # Macros
-    ("NUMBER",   r"\d+(\.\d*)?"),               # Integer or decimal number
+    ("DECIMAL",  r"[0-9]+\.[0-9]*"),            # Decimal number
+    ("INTEGER",  r"[0-9]+"),                    # Integer number
     ("KEYWORD",  KEYWORD_PATTERN),              # Keywords
     ("DICE",     r"[d]"),                       # Diceroll operators
     ("DIETYPE",  r"[cF]"),                      # Special types of dice usable with the diceroll operator
@@ -42,31 +48,50 @@ TOKEN_SPEC = [
     ("OP",       r"[+\-*×÷%^(){}]|//?"),        # Generic operators
     ("SEP",      r"[,]"),                       # Separators like commas
     ("END",      r"[;\n]"),                     # Line end / break characters
-    ("SKIP",     r"[ \t]+"),                    # Skip over spaces and tabs
+    ("SKIP",     r"[ \t]+"),                    # Trailing spaces and tabs
     ("MISMATCH", r"."),                         # Any other character
 ]
+# Whitespace before a token is consumed as part of its match, so spaces only
+# reach the tokenizer loop as a SKIP at the very end of the input.
 TOKEN_PATTERN = re.compile(
-    '|'.join(f"(?P<{pair[0]}>{pair[1]})" for pair in TOKEN_SPEC))
+    r"[ \t]*(?:"
+    + '|'.join(f"(?P<{pair[0]}>{pair[1]})" for pair in TOKEN_SPEC)
+    + ")")
 # fmt: on
+# Token kinds whose symbol type is keyed by the matched text itself.
+VALUE_KEYED_KINDS = frozenset(
+    ("OP", "DICE", "KEYWORD", "SEP", "COMP", "SETOP", "SETSEL")
+)
+
+# Symbol kinds classified once when their symbol type is registered.
+RAW_VALUE_KINDS = frozenset(("NUMBER", "DIETYPE"))
+GROUPING_KINDS = frozenset(("(", "[", "#"))
+SET_OPERATION_KINDS = frozenset(
+    ("k", "p", "?", "~?", "{", "repeat", "agg", "!", "!o", "r", "rr")
+)
+SELECTOR_KINDS = frozenset(
+    ("=", "~=", ">", ">=", "<", "<=", "h", "l", "even", "odd", "@")
+)
 
 COMPARISONS = {
-    "=": lambda x, y: x == y,
-    ">": lambda x, y: x > y,
-    "<": lambda x, y: x < y,
-    ">=": lambda x, y: x >= y,
-    "<=": lambda x, y: x <= y,
-    "~=": lambda x, y: x != y,
+    "=": operator.eq,
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "~=": operator.ne,
 }
 
 ARITHMETICS = {
-    "+": lambda x, y: x + y,
-    "-": lambda x, y: x - y,
-    "*": lambda x, y: x * y,
-    "/": lambda x, y: x / y,
-    "//": lambda x, y: x // y,
-    "%": lambda x, y: x % y,
-    "^": lambda x, y: x**y,
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "//": operator.floordiv,
+    "%": operator.mod,
+    "^": operator.pow,
 }
+ARITHMETIC_KINDS = frozenset(ARITHMETICS)
 
 
 class MacroData:
@@ -114,94 +139,106 @@ def get_default_macros():
     return md
 
 
-# Inner function for symbolize.
-# Returns the all_rolls and current_roll lists with symbols from intext added.
-# Recursively called for macro expansion.
-def _symbolize(
-    symbol_table,
-    intext: str,
-    macro_data: MacroData,
-    all_rolls: list = [],
-    current_roll: list = [],
-    depth=0,
-):
+# Number of distinct input texts whose scanned tokens are kept.
+SCAN_CACHE_SIZE = 256
+
+
+# Converts the text matched for each kind of token into its scanned
+# (kind, symbol_id, value) token. The symbol_id keys the symbol type, and value
+# is the token's converted payload (number, die type, label text or macro name).
+# Kinds without a handler (SKIP, MISMATCH) produce no token.
+SCAN_HANDLERS = {
+    **{
+        kind: (lambda text, kind=kind: (kind, text, text)) for kind in VALUE_KEYED_KINDS
+    },
+    "LABEL": lambda text: ("LABEL", "[", text[1:-1]),
+    "COMMENT": lambda text: ("LABEL", "#", text[1:]),
+    "INTEGER": lambda text: ("NUMBER", "NUMBER", int(text)),
+    "DECIMAL": lambda text: ("NUMBER", "NUMBER", float(text)),
+    "DIETYPE": lambda text: ("DIETYPE", "DIETYPE", SpecialDie(text)),
+    "MACRO": lambda text: ("MACRO", "MACRO", text[1:]),
+    "END": lambda text: ("END", "END", text),
+}
+
+
+# Cuts intext into a tuple of scanned tokens.
+# Cached, since the same formulas and macro bodies tend to be rolled repeatedly.
+@functools.lru_cache(maxsize=SCAN_CACHE_SIZE)
+def _scan(intext: str) -> tuple:
+    tokens = []
+    append = tokens.append
+    handlers = SCAN_HANDLERS
     for item in TOKEN_PATTERN.finditer(intext):
-        # Cut input into tokens.
         # https://docs.python.org/3.6/library/re.html#writing-a-tokenizer
         kind = item.lastgroup  # group name
-        value = item.group()
-
-        if kind == "LABEL":
-            value = process_label_match(value)
-        elif kind == "NUMBER":
-            if "." in value:
-                value = float(value)
-            else:
-                value = int(value)
-        elif kind == "DIETYPE":
-            value = SpecialDie(value)
-        elif kind == "MACRO":
-            mname = value[1:]
-            macro = macro_data.get_macro_content(mname)
+        handler = handlers.get(kind)
+        if handler is None:
+            if kind == "MISMATCH":
+                raise RuntimeError(f"Couldn't interpret <{item[kind]}> from: {intext}")
+            continue  # SKIP
+        append(handler(item[kind]))  # matched text, without leading whitespace
+    return tuple(tokens)
+
+
+# Inner generator for symbolize_stream.
+# Adds symbols from intext to current_roll, yielding each roll completed by an
+# end token. Recursively called for macro expansion.
+def _symbolize(
+    symbol_table: dict,
+    intext: str,
+    macro_data: MacroData,
+    current_roll: list,
+    depth: int = 0,
+) -> typing.Iterator[list]:
+    append = current_roll.append
+    lookup = symbol_table.get
+    for kind, symbol_id, value in _scan(intext):
+        if kind == "MACRO":
+            macro = macro_data.get_macro_content(value)
             if macro is None:
-                raise RuntimeError(f"Can't find macro {mname}")
+                raise RuntimeError(f"Can't find macro {value}")
             if depth > MACRO_DEPTH_CAP:
                 raise RuntimeError(
-                    f"Exceeded maximum macro depth {MACRO_DEPTH_CAP} with {mname}"
+                    f"Exceeded maximum macro depth {MACRO_DEPTH_CAP} with {value}"
                 )
-            all_rolls, current_roll = _symbolize(
+            yield from _symbolize(
                 symbol_table=symbol_table,
                 intext=macro,
                 macro_data=macro_data,
-                all_rolls=all_rolls,
                 current_roll=current_roll,
                 depth=depth + 1,
             )
             continue
 
-        # pass OP, END
-        elif kind == "SKIP":
-            continue
-        elif kind == "MISMATCH":
-            raise RuntimeError(f"Couldn't interpret <{value}> from: {intext}")
-
-        # determine the symbol type
-        symbol_id = kind
-        if kind in ("OP", "DICE", "KEYWORD", "SEP", "COMP", "SETOP", "SETSEL"):
-            symbol_id = value
-        if kind == "LABEL":
-            symbol_id = item.group()[0]
-        try:  # look up symbol type
-            symbol = symbol_table[symbol_id]
-        except KeyError:
+        symbol = lookup(symbol_id)  # look up symbol type
+        if symbol is None:
             raise SyntaxError(f"Failed to find symbol type for {symbol_id}")
 
         # construct the symbol instance and populate its value if needed
         token = symbol()
         if kind == "NUMBER" or kind == "DIETYPE":
             token._value = value
-        if kind == "LABEL":
+        elif kind == "LABEL":
             token.label = value
-        current_roll.append(token)
+        append(token)
 
-        # if reached an end token, wrap up the current roll
+        # if reached an end token, hand off the current roll and start another
+        # (cleared in place, since macro expansions share the same list)
         if kind == "END":
-            all_rolls.append(current_roll)
-            current_roll = []
-
-    return (all_rolls, current_roll)
+            yield current_roll.copy()
+            current_roll.clear()
 
 
-# Tokenizes a formula to symbol instances and divides them into individual rolls.
-def symbolize(symbol_table, intext: str, macro_data: MacroData):
-    all_rolls = []
+# Tokenizes a formula to symbol instances, yielding them divided into
+# individual rolls as soon as each roll is complete.
+def symbolize_stream(
+    symbol_table: dict, intext: str, macro_data: MacroData
+) -> typing.Iterator[list]:
     current_roll = []
-
-    all_rolls, current_roll = _symbolize(
+    yield from _symbolize(
         symbol_table=symbol_table,
         intext=intext,
         macro_data=macro_data,
-        all_rolls=all_rolls,
         current_roll=current_roll,
     )
 
@@ -209,22 +246,12 @@ def symbolize(symbol_table, intext: str, macro_data: MacroData):
     if len(current_roll) > 0:
         if current_roll[-1]._kind != "END":
             current_roll.append(symbol_table["END"]())
-        all_rolls.append(current_roll)
-    return all_rolls
-
-
-def process_label_match(matched: str) -> str:
-    if matched[0] == "[":
-        if matched[-1] != "]":
-            raise RuntimeError(
-                f"Missing expected closing bracket of label regex match: {matched}"
-            )
-        return matched[1:-1]
+        yield current_roll
 
-    if matched[0] == "#":
-        return matched[1:]
 
-    raise RuntimeError(f"Unexpected format for label regex match: {matched}")
+# Tokenizes a formula to symbol instances and divides them into individual rolls.
+def symbolize(symbol_table: dict, intext: str, macro_data: MacroData) -> list[list]:
+    return list(symbolize_stream(symbol_table, intext, macro_data))
 
 
 # Based on Pratt top-down operator precedence.
@@ -235,14 +262,34 @@ class Evaluator:
 
     # Syntax tree base class
     class _Symbol:
+        # Per-node state is slotted; a parse allocates one node per token.
+        # Subclasses must declare empty __slots__ to avoid gaining a __dict__.
+        __slots__ = (
+            "_value",
+            "detail",
+            "first",
+            "second",
+            "label",
+            "_expands",
+            "_described",
+        )
+
         # token type.
         _kind = None
+        # token type, escaped for display in markdown
+        _escaped_kind = None
         # operator binding power, 0 for literals.
         _bp = 0
 
         # add function-call parens when displaying operator with children
         _function_like = False
 
+        # classification of the token type, set by register_symbol
+        _contains_raw_value = False
+        _is_grouping = False
+        _is_set_operation = False
+        _is_selector = False
+
         def __init__(self):
             # numerical literal or resolved computation value
             self._value = None
@@ -256,6 +303,12 @@ class Evaluator:
             # tag or comment text
             self.label: str | None = None
 
+            # memoized should_show_expansion(), filled in once evaluated
+            self._expands: bool | None = None
+            # memoized unevaluated describe(), which depends only on the
+            # finished subtree's shape
+            self._described: str | None = None
+
         def get_value(self):
             if self._value != None:
                 return self._value
@@ -281,29 +334,54 @@ class Evaluator:
             return False
 
         def contains_raw_value(self) -> bool:
-            return self._kind == "NUMBER" or self._kind == "DIETYPE"
+            return self._contains_raw_value
 
         def is_grouping(self) -> bool:
-            return self._kind == "(" or self._kind == "[" or self._kind == "#"
+            return self._is_grouping
 
-        # Recursively describe this expression.
+        # Describe this expression.
         # This should resemble the original input.
         # If `evaluated`, the description reduces nodes lacking dice operations
         # to their result value and shows the results of dicerolls.
         # If `top_level`, sets of expressions are allowed to join with newlines for
         # better readability.
+        # Walks the tree with an explicit stack, collecting fragments to join once.
+        # Unevaluated descriptions are kept per node, since subtrees are described
+        # again by enclosing sets, repeats and the final output.
         def describe(
             self, evaluated=False, top_level=False, absorbed_dice=False
         ) -> str:
+            if not evaluated and self._described is not None:
+                return self._described
+            out = []
+            stack = [(self, evaluated, top_level, absorbed_dice)]
+            while stack:
+                part = stack.pop()
+                if isinstance(part, str):
+                    out.append(part)
+                elif not part[1] and part[0]._described is not None:
+                    out.append(part[0]._described)
+                else:
+                    node, *options = part
+                    stack.extend(reversed(node._describe_parts(*options)))
+            described = "".join(out)
+            if not evaluated:
+                self._described = described
+            return described
+
+        # Fragments making up this node's description, in order.
+        # Strings are emitted as-is. Tuples of (node, evaluated, top_level,
+        # absorbed_dice) are children to be described in their place.
+        def _describe_parts(self, evaluated, top_level, absorbed_dice) -> list:
             if self.second == None and self.first == None:
-                if self._kind in ARITHMETICS.keys():
+                if self._kind in ARITHMETIC_KINDS:
                     # display lone symbol if used as operand such as in agg()
-                    return f"{self._kind}"
+                    return [f"{self._kind}"]
                 if self.detail:
-                    return ExprResult.description(self.detail, evaluated, top_level)
+                    return [ExprResult.description(self.detail, evaluated, top_level)]
                 if not self.contains_raw_value():
-                    log.info(f"does not contain raw value: {self._kind}")
-                return str(self)
+                    log.debug("does not contain raw value: %s", self._kind)
+                return [str(self)]
 
             if self.is_grouping():
                 if not self.first:
@@ -312,67 +390,65 @@ class Evaluator:
                     raise RuntimeError(
                         f"Unexpected second child for grouping node {self}"
                     )
-                raw_first = self.first.describe(
-                    evaluated=evaluated,
-                    top_level=top_level,
-                    absorbed_dice=absorbed_dice,
-                )
+                raw_first = (self.first, evaluated, top_level, absorbed_dice)
                 if self._kind == "(":  # parenthesis group
-                    return "(" + raw_first + ")"
+                    return ["(", raw_first, ")"]
                 if self._kind == "[":
-                    return raw_first + f"[{self.label}]"
+                    return [raw_first, f"[{self.label}]"]
                 if self._kind == "#":
-                    return raw_first + f" #{self.label}"
+                    return [raw_first, f" #{self.label}"]
 
             absorb_child = False
             if evaluated:
                 if not self.should_show_expansion():
                     if self.get_value() == None:
-                        return escape(str(self))
-                    return f"{self.get_value()}"
+                        return [escape(str(self))]
+                    return [f"{self.get_value()}"]
                 if self.detail and not self.is_diceroll() and not self.is_selector():
-                    return ExprResult.description(self.detail, evaluated, top_level)
+                    return [ExprResult.description(self.detail, evaluated, top_level)]
                 if self.is_set_operation() and self.first and self.first.is_diceroll():
                     absorb_child = True
 
             describe_first = (
-                self.first.describe(evaluated=evaluated, absorbed_dice=absorb_child)
-                if self.first
-                else ""
+                [(self.first, evaluated, False, absorb_child)] if self.first else []
             )
             describe_second = (
-                self.second.describe(evaluated=evaluated) if self.second else ""
+                [(self.second, evaluated, False, False)] if self.second else []
             )
             spacer = " " if self.should_spaces() else ""
 
             if self._function_like:
-                close_function = ")"
-                if len(describe_second) > 0:
-                    close_function = f",{spacer}{describe_second})"
-                return f"{self._kind}({describe_first}" + close_function
+                if describe_second:
+                    close_function = [f",{spacer}", *describe_second, ")"]
+                else:
+                    close_function = [")"]
+                return [f"{self._kind}(", *describe_first, *close_function]
 
             left = describe_first
             right = describe_second
-            op = escape(self._kind)
+            op = self._escaped_kind
             if self.second == None and not self.should_postfix():
-                left = ""
+                left = []
                 right = describe_first
 
-            main_description = f"{left}{spacer}{op}{spacer}{right}"
+            parts = [*left, spacer, op, spacer, *right]
 
             if evaluated and not absorbed_dice and self.is_diceroll():
                 dice_description = ExprResult.description(
                     self.detail, evaluated, top_level
                 )
-                main_description = f"{main_description} {dice_description}"
+                parts.append(f" {dice_description}")
 
-            return main_description
+            return parts
 
         def __repr__(self):
-            if self.contains_raw_value():
+            if self._contains_raw_value:
                 return str(self._value)
-            out = [self._kind, self.first, self.second]
-            out = map(str, filter(None, out))  # type: ignore
+            out: list[str] = [self._kind]
+            if self.first is not None:
+                out.append(str(self.first))
+            if self.second is not None:
+                out.append(str(self.second))
             return "<" + " ".join(out) + ">"
 
         def final_repr(self):
@@ -392,91 +468,72 @@ class Evaluator:
             return self.is_diceroll() or self.is_set_operation() or self.is_selector()
 
         def is_set_operation(self):
-            return self._kind in (
-                "k",
-                "p",
-                "?",
-                "~?",
-                "{",
-                "repeat",
-                "agg",
-                "!",
-                "!o",
-                "r",
-                "rr",
-            )
+            return self._is_set_operation
 
         def is_selector(self):
-            return self._kind in (
-                "=",
-                "~=",
-                ">",
-                ">=",
-                "<",
-                "<=",
-                "h",
-                "l",
-                "even",
-                "odd",
-                "@",
-            )
+            return self._is_selector
 
         # Is this node dice, or does could a node in this subtree have dice?
+        # Only asked of evaluated subtrees, so the answer is kept per node.
         def should_show_expansion(self):
-            if self.is_collection() or self.label:
-                return True
-            if self.first != None:
-                has_dice = self.first.should_show_expansion()
-                if self.second != None:
-                    has_dice = has_dice or self.second.should_show_expansion()
-                return has_dice
-            return False
-
-    def __init__(self, tokens):
+            if self._expands is None:
+                has_dice = False
+                if self.is_collection() or self.label:
+                    has_dice = True
+                elif self.first != None:
+                    has_dice = self.first.should_show_expansion()
+                    if self.second != None:
+                        has_dice = has_dice or self.second.should_show_expansion()
+                self._expands = has_dice
+            return self._expands
+
+    def __init__(self, tokens: list) -> None:
+        self.reset(tokens)
+
+    # Start over on another list of symbols, so one evaluator can parse each
+    # roll of a formula in turn.
+    def reset(self, tokens: list) -> None:
         self.token_list = tokens
         self.iter_pos = -1
         self.token_current = None
         self._next()
 
-    def _jump_to(self, token_pos):
-        try:
-            self.token_current = self.token_list[token_pos]
-            self.iter_pos = token_pos
-        except IndexError as err:
-            raise IndexError(f"Can't iterate from token position {token_pos}") from err
-        return self.token_current
-
-    def _next(self):
-        try:
-            self.token_current = self.token_list[self.iter_pos + 1]
-            self.iter_pos += 1
-        except (StopIteration, IndexError) as err:
-            raise StopIteration(f"Expected further input. Missing operands?") from err
+    def _jump_to(self, token_pos: int) -> _Symbol:
+        if not -len(self.token_list) <= token_pos < len(self.token_list):
+            raise IndexError(f"Can't iterate from token position {token_pos}")
+        self.token_current = self.token_list[token_pos]
+        self.iter_pos = token_pos
         return self.token_current
 
-    def _current(self):
+    def _next(self) -> _Symbol:
+        token_pos = self.iter_pos + 1
+        if token_pos >= len(self.token_list):
+            raise StopIteration(f"Expected further input. Missing operands?")
+        self.token_current = self.token_list[token_pos]
+        self.iter_pos = token_pos
         return self.token_current
 
     def peek(self) -> _Symbol | None:
-        try:
-            peeked = self.token_list[self.iter_pos]
-        except IndexError:
+        if self.iter_pos >= len(self.token_list):
             return None
-        return peeked
+        return self.token_list[self.iter_pos]
 
-    def advance(self, expected=None):
-        if expected and self._current()._kind != expected:  # type: ignore
+    def advance(self, expected: str | None = None) -> _Symbol:
+        if expected and self.token_current._kind != expected:  # type: ignore
             raise SyntaxError(f"Missing expected: {expected}")
         return self._next()
 
     # Parse and evaluate an expression from symbols. Recursive.
-    def expr(self, right_bp=0):
-        prev = self._current()
-        self._next()
+    def expr(self, right_bp: int = 0) -> _Symbol:
+        # The position is re-read from self after each denotation, since
+        # those parse their own operands and advance past them.
+        next_token = self._next
+        prev = self.token_current
+        next_token()
         left = prev.as_prefix(self)  # type: ignore
-        while right_bp < self._current()._bp:  # type: ignore
-            prev = self._current()
-            self._next()
+        while right_bp < self.token_current._bp:  # type: ignore
+            prev = self.token_current
+            next_token()
             left = prev.as_infix(self, left)  # type: ignore
         return left
 
@@ -487,12 +544,17 @@ class Evaluator:
         except KeyError:
 
             class s(Evaluator._Symbol):
-                pass
+                __slots__ = ()
 
             s.__name__ = "symbol-" + symbol_kind
             s.__qualname__ = "symbol-" + symbol_kind
             s._kind = symbol_kind
+            s._escaped_kind = escape(symbol_kind)
             s._bp = bind_power
+            s._contains_raw_value = symbol_kind in RAW_VALUE_KINDS
+            s._is_grouping = symbol_kind in GROUPING_KINDS
+            s._is_set_operation = symbol_kind in SET_OPERATION_KINDS
+            s._is_selector = symbol_kind in SELECTOR_KINDS
             Evaluator.SYMBOL_TABLE[symbol_kind] = s
         else:
             s._bp = max(bind_power, s._bp)
@@ -584,13 +646,16 @@ class Evaluator:
     @staticmethod
     def register_function_double(kind, func):
         # Two-arg function.
+        # `func` is also given the token position of the first argument, from
+        # which it may re-parse that argument.
         def _as_function(self, evaluator):
             evaluator.advance("(")
+            args_pos = evaluator.iter_pos
             self.first = evaluator.expr()
             evaluator.advance(",")
             self.second = evaluator.expr()
             evaluator.advance(")")
-            func(self, self.first, self.second, evaluator)
+            func(self, self.first, self.second, evaluator, args_pos)
             return self
 
         s = Evaluator.register_symbol(kind)
@@ -602,7 +667,7 @@ class Evaluator:
     # A break token results in several trees.
     def evaluate(self):
         ret = self.expr()
-        if self._current()._kind != "END":  # type: ignore
+        if self.token_current._kind != "END":  # type: ignore
             raise SyntaxError("Parse error: missing operators?")
         return ret
 
@@ -613,26 +678,27 @@ def roll(formula: str, macro_data: MacroData | None = None):
 
     if macro_data is None:
         macro_data = get_default_macros()
-    rolls = symbolize(Evaluator.SYMBOL_TABLE, formula, macro_data)
-
     results = []
-    for roll in rolls:
-        e = Evaluator(roll)
+    e = None
+    for roll in symbolize_stream(Evaluator.SYMBOL_TABLE, formula, macro_data):
+        if e is None:
+            e = Evaluator(roll)
+        else:
+            e.reset(roll)
         results.append(e.evaluate())
     return results
 
 
 def format_roll_results(results: list[Evaluator._Symbol]):
-    out = ""
+    out = []
     for row in results:
         final_value = row.final_repr()
-        out += (
+        out.append(
             codeblock(row.describe())
             + f" ⇒ **{final_value}**"
-            + f"  |  {row.describe(evaluated=True, top_level=True)}"
+            + f"  |  {row.describe(evaluated=True, top_level=True)}\n"
         )
-        out += "\n"
-    return out
+    return "".join(out)
 
 
 def _dice_operator(node, x, y):
@@ -745,8 +811,17 @@ def _negate_operator(node, x):
     node._value = -x.get_value()
 
 
+def _lookup_factorial(n: int) -> int:
+    if n < 0:
+        raise ValueError(f"Can't take factorial of a negative number ({n})")
+    if n < len(FACTORIAL_TABLE):
+        return FACTORIAL_TABLE[n]
+    return factorial(n)
+
+
 def _factorial_operator(node, x):
-    node._value = factorial(x.get_value())
+    n = force_integral(x.get_value(), "factorial operand")
+    node._value = _lookup_factorial(n)
 
 
 def _ceil_operator(node, x):
@@ -760,6 +835,8 @@ def _floor_operator(node, x):
 def _permutation_operator(node, x, y):
     n = force_integral(x.get_value(), "permutation operand (n)")
     k = force_integral(y.get_value(), "permutation operand (k)")
+    if n < 0 or k < 0:
+        raise ValueError("permute operator must have positive operands")
     node._value = perm(n, k)
 
 
@@ -768,19 +845,14 @@ def _choose_operator(node, x, y):
     k = force_integral(y.get_value(), "choice operand (k)")
     if n < 0 or k < 0:
         raise ValueError("choose operator must have positive operands")
-    if k > n:
-        node._value = 0
-    else:
-        node._value = factorial(n) / (factorial(k) * factorial(n - k))
-        if node._value.is_integer():
-            node._value = int(node._value)
+    node._value = comb(n, k)  # 0 when k > n
 
 
 def _sqrt_operator(node, x):
     node._value = sqrt(x.get_value())
 
 
-def _repeat_function(node, x, y, ev):
+def _repeat_function(node, x, y, ev, args_pos):
     exit_iter_pos = ev.iter_pos
 
     reps = force_integral(y.get_value(), "repetitions")
@@ -795,9 +867,14 @@ def _repeat_function(node, x, y, ev):
             x.get_value(), x.describe(), x.describe(evaluated=True), x.final_repr()
         )
     ]
+    if not x.should_show_expansion():
+        # nothing random to reroll, so every repetition has the same result
+        node.detail = MultiExpr(flats * reps)
+        return
+
     redo_node = x
     for i in range(reps - 1):
-        ev._jump_to(ev.token_list.index(node) + 2)  # skip function open paren
+        ev._jump_to(args_pos)
         redo_node = ev.expr()
         flats.append(
             FlatExpr(
@@ -814,7 +891,9 @@ def _repeat_function(node, x, y, ev):
 
 
 def build_success_lambda(compare_operator, target):
-    return lambda x: COMPARISONS[compare_operator](x, target)
+    # look up the comparison once instead of per element
+    compare = COMPARISONS[compare_operator]
+    return lambda x: compare(x, target)
 
 
 # value-value comparison is forced to treat the left-side value as a set containing the single element.
@@ -858,7 +937,7 @@ def aggregate_using(setr, agg_func, agg_joiner=", "):
     return AggregateValues(agg_func, agg_joiner, items=setr.elements)
 
 
-def _aggregate_function(node, x, y, ev):
+def _aggregate_function(node, x, y, ev, args_pos):
     try:
         agg_func = ARITHMETICS[y._kind]
         node.detail = aggregate_using(x.detail, agg_func, y._kind)
@@ -944,31 +1023,48 @@ Evaluator.register_function_single("fact", _factorial_operator)
 Evaluator.register_function_single("sqrt", _sqrt_operator)
 
 # Arithmetic operators given reflex nud to allow their use as agg operands
-Evaluator.register_infix("+", build_arithmetic_operator("+"), 10).as_prefix = _reflex_nud  # type: ignore
+# (symbol, operation, binding power)
+ARITHMETIC_SYMBOLS = [
+    ("+", "+", 10),
+    ("*", "*", 20),
+    ("/", "/", 20),
+    ("//", "//", 20),
+    ("%", "%", 20),
+    ("×", "*", 20),
+    ("÷", "/", 20),
+]
+for kind, operation, bind_power in ARITHMETIC_SYMBOLS:
+    symbol = Evaluator.register_infix(
+        kind, build_arithmetic_operator(operation), bind_power
+    )
+    if kind in ARITHMETIC_KINDS:  # symbols which are also agg operands
+        symbol.as_prefix = _reflex_nud  # type: ignore
 Evaluator.register_infix(
     "-", build_arithmetic_operator("-"), 10
 ).as_prefix = build_dash_nud(  # dash nud special case because of negation prefix
     100
 )  # type: ignore
-Evaluator.register_infix("*", build_arithmetic_operator("*"), 20).as_prefix = _reflex_nud  # type: ignore
-Evaluator.register_infix("×", build_arithmetic_operator("*"), 20)
-Evaluator.register_infix("/", build_arithmetic_operator("/"), 20).as_prefix = _reflex_nud  # type: ignore
-Evaluator.register_infix("//", build_arithmetic_operator("//"), 20).as_prefix = _reflex_nud  # type: ignore
-Evaluator.register_infix("÷", build_arithmetic_operator("/"), 20)
-Evaluator.register_infix("%", build_arithmetic_operator("%"), 20).as_prefix = _reflex_nud  # type: ignore
 Evaluator.register_infix("^", build_arithmetic_operator("^"), 110, right_assoc=True).as_prefix = _reflex_nud  # type: ignore
 
 # Combinatorics
-Evaluator.register_infix("P", _permutation_operator, 130, spaces=True)
-Evaluator.register_infix("permute", _permutation_operator, 130, spaces=True)
-Evaluator.register_infix("C", _choose_operator, 130, spaces=True)
-Evaluator.register_infix("choose", _choose_operator, 130, spaces=True)
+for kind, func in (
+    ("P", _permutation_operator),
+    ("permute", _permutation_operator),
+    ("C", _choose_operator),
+    ("choose", _choose_operator),
+):
+    Evaluator.register_infix(kind, func, 130, spaces=True)
 
 # Set Operators
-Evaluator.register_infix("k", _set_keep_operator, 180)
-Evaluator.register_infix("p", _set_drop_operator, 180)
-Evaluator.register_infix("?", _set_count_pass_operator, 180)
-Evaluator.register_infix("~?", _set_count_fail_operator, 180)
+for kind, func in (
+    ("k", _set_keep_operator),
+    ("p", _set_drop_operator),
+    ("?", _set_count_pass_operator),
+    ("~?", _set_count_fail_operator),
+    ("r", _reroll_once_operator),
+    ("rr", _reroll_recursive_operator),
+):
+    Evaluator.register_infix(kind, func, 180)
 Evaluator.register_hybrid_infix_postfix(
     "!",
     _explode_infix_operator,
@@ -987,8 +1083,6 @@ Evaluator.register_hybrid_infix_postfix(
 ).should_postfix = (
     lambda self: self._kind == "!o" and self.second is None
 )
-Evaluator.register_infix("r", _reroll_once_operator, 180)
-Evaluator.register_infix("rr", _reroll_recursive_operator, 180)
 
 # Set Selectors
 Evaluator.register_prefix("h", _select_high_operator, 190)
@@ -1000,7 +1094,6 @@ Evaluator.register_prefix("@", _select_index_operator, 190)
 # Comparisons
 for comp in COMPARISONS.keys():
     Evaluator.register_infix(comp, build_infix_comparison(comp), 5)
-for comp in COMPARISONS.keys():
     Evaluator.register_prefix(
         comp, build_prefix_comparison(comp), 190
     ).should_spaces = (lambda self: self.second != None)
@@ -1015,12 +1108,13 @@ Evaluator.register_postfix("[", _label_operator, 15)
 
 if __name__ == "__main__":
     macro_data = get_default_macros()
+    symbol_table = Evaluator.SYMBOL_TABLE
     while True:
         intext = input()
         try:
-            symbols = symbolize(Evaluator.SYMBOL_TABLE, intext, macro_data)
+            symbols = symbolize(symbol_table, intext, macro_data)
             print(symbols)
-            results = roll(intext)
+            results = roll(intext, macro_data)
             print(format_roll_results(results))
         except (
             ArithmeticError,
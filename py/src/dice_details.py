@@ -1,9 +1,11 @@
 from enum import Enum
 import functools
+import heapq
+import math
 import operator
 import typing
 from functools import total_ordering
-from random import choice, randint
+from random import choices, randint
 
 from utils import escape
 
@@ -22,6 +24,8 @@ SPECIAL_DIE_SIDES = {
     SpecialDie.COIN: {0: "T", 1: "H"},
     SpecialDie.FATE: {-1: "-", 0: "0", 1: "+"},
 }
+# Rollable values of each special die, in side order.
+SPECIAL_DIE_FACES = {die: tuple(sides) for die, sides in SPECIAL_DIE_SIDES.items()}
 
 
 def force_integral(value, description="") -> int:
@@ -35,10 +39,17 @@ def force_integral(value, description="") -> int:
 
 # Represents the value of one element in a set.
 # Tracks whether or not it has been dropped or added to the set.
-class SetElement(typing.NamedTuple):
-    item: typing.Any
-    dropped: bool = False
-    added: bool = False
+# Mutable, so each set owns its elements; see SetResult.__init__.
+class SetElement:
+    __slots__ = ("item", "dropped", "added")
+
+    def __init__(self, item: typing.Any, dropped: bool = False, added: bool = False):
+        self.item = item
+        self.dropped = dropped
+        self.added = added
+
+    def copy(self):
+        return SetElement(self.item, self.dropped, self.added)
 
     def formatted(self, text=None) -> str:
         if text is None:
@@ -131,16 +142,20 @@ class FlatExpr(ExprResult):
 class SetResult(ExprResult):
     def __init__(self, items: list | None = None):
         super().__init__()
-        # create SetElements for each input item, unless already provided with SetElements (copying from another set)
+        # create SetElements for each input item, or copy them when already
+        # provided with SetElements (copying from another set)
         self.elements: list[SetElement] = (
             [
-                (item if isinstance(item, SetElement) else SetElement(item=item))
+                (item.copy() if isinstance(item, SetElement) else SetElement(item))
                 for item in items
             ]
             if items
             else []
         )
         self.result_value = self
+        self._remaining = None  # cached by get_remaining until elements change
+        # kept up to date by the mutators, so counting needs no list
+        self._dropped_count = sum(1 for element in self.elements if element.dropped)
 
     def __repr__(self):
         return f"{len(self.elements)} element" + (
@@ -151,7 +166,7 @@ class SetResult(ExprResult):
         return iter(self.get_remaining())
 
     def copy(self):
-        return SetResult(items=self.elements.copy())
+        return SetResult(items=self.elements)
 
     def set_value(self, value):
         self.result_value = value
@@ -177,57 +192,84 @@ class SetResult(ExprResult):
         return [element.item for element in self.elements]
 
     # Exclude dropped items.
+    # The returned list is shared between calls and must not be modified.
     def get_remaining(self):
-        return [element.item for element in self.elements if element.dropped == False]
+        if self._remaining is None:
+            self._remaining = [
+                element.item for element in self.elements if not element.dropped
+            ]
+        return self._remaining
 
     def get_remaining_count(self):
-        return len(self.get_remaining())
+        return len(self.elements) - self._dropped_count
 
     # Return a list of all tuples of (index, non-dropped item).
-    def get_remaining_enumerated(self):
+    # Elements before index `start` are skipped.
+    def get_remaining_enumerated(self, start=0):
         return [
-            (fpair[0], fpair[1].item)
-            for fpair in filter(
-                lambda pair: not pair[1].dropped,
-                enumerate(self.elements),
-            )
+            (i, element.item)
+            for i, element in enumerate(self.elements[start:], start)
+            if not element.dropped
         ]
 
     # Accumulate remaining items' values, by default using a sum.
     def total(self, func=operator.add):
         if self.get_remaining_count() < 1:
             return 0
-        values = [ExprResult.value(item) for item in self.get_remaining()]
+        value = ExprResult.value
+        values = [value(item) for item in self.get_remaining()]
+        if len(values) == 1:
+            # a lone value is returned as is, even if it can't be added to 0
+            return values[0]
+        # builtins for the common operators, instead of calling func per item
+        if func is operator.add:
+            return sum(values)
+        if func is operator.mul:
+            return math.prod(values)
         return functools.reduce(func, values)
 
     # Drop items located at specific indices
     def drop_indices(self, indices: list[int]):
+        self._remaining = None
+        elements = self.elements
         for i in indices:
-            self.elements[i] = SetElement(
-                item=self.elements[i].item, dropped=True, added=self.elements[i].added
-            )
+            element = elements[i]
+            if not element.dropped:
+                element.dropped = True
+                self._dropped_count += 1
 
     # Add items as new set elements
     def append_items(self, items: list):
+        self._remaining = None
         for item in items:
             self.elements.append(SetElement(item=item, dropped=False, added=True))
 
     # Add item before a specific index in the list of elements
     def insert_item(self, index: int, item, dropped=False):
+        self._remaining = None
+        if dropped:
+            self._dropped_count += 1
         self.elements.insert(index, SetElement(item=item, dropped=dropped, added=True))
 
 
 class DiceValues(SetResult):
-    def __init__(self, dice_size, items):
+    # A known `value` (such as when copying) is used instead of summing the items.
+    def __init__(self, dice_size, items, value=None):
         super().__init__(items)
         self.dice_size: int | SpecialDie = dice_size
-        self.set_value(self.total())
+        self.set_value(self.total() if value is None else value)
 
     def __repr__(self):
         return str(self.get_value())
 
     def copy(self):
-        return DiceValues(self.dice_size, self.elements)
+        return DiceValues(self.dice_size, self.elements, value=self.get_value())
+
+    # Override. Rolled dice are plain numbers, so they need no unwrapping.
+    def total(self, func=operator.add):
+        if func is operator.add:
+            return sum(self.get_remaining())
+        return super().total(func)
 
     # Override to wrap and use `+` to join.
     def get_description(self, joiner="+"):
@@ -393,6 +435,12 @@ class SetSelector(ExprResult):
     def apply(self, setr: SetResult) -> list[int]:
         raise NotImplementedError("Set selector behavior is missing.")
 
+    # Like apply, for a set whose elements before index `start` were already
+    # checked by this selector and left unmatched.
+    # Selectors comparing items against each other must see the whole set.
+    def apply_appended(self, setr: SetResult, start: int) -> list[int]:
+        return self.apply(setr)
+
 
 # Set selector. Finds all items satisfying the condition.
 # Returns a list of indices of elements that match.
@@ -410,15 +458,18 @@ class ConditionalSelector(SetSelector):
     def apply(self, setr: SetResult) -> list[int]:
         return _select_conditional(setr, self.condition)
 
+    # Override. Earlier items were already checked against the condition.
+    def apply_appended(self, setr: SetResult, start: int) -> list[int]:
+        return _select_conditional(setr, self.condition, start)
+
 
 def _select_conditional(
-    setr: SetResult, condition: typing.Callable[..., bool]
+    setr: SetResult, condition: typing.Callable[..., bool], start: int = 0
 ) -> list[int]:
-    elements = setr.get_remaining_enumerated()
-    matched_pairs = list(
-        filter(lambda pair: condition(ExprResult.value(pair[1])), elements)
-    )
-    return [pair[0] for pair in matched_pairs]
+    value = ExprResult.value
+    return [
+        i for i, item in setr.get_remaining_enumerated(start) if condition(value(item))
+    ]
 
 
 # Set selector. Finds the `n` lowest or highest values in the set.
@@ -426,7 +477,8 @@ def _select_conditional(
 class LowHighSelector(SetSelector):
     def __init__(self, num: int = 1, high: bool = False) -> None:
         super().__init__()
-        self.num: int = num
+        # validated once here rather than on each application
+        self.num: int = _check_select_count(num)
         self.high: bool = high
 
     def get_description(self) -> str:
@@ -436,20 +488,29 @@ class LowHighSelector(SetSelector):
         return _select_low_high(setr, self.num, self.high)
 
 
-def _select_low_high(setr: SetResult, n: int, high: bool = False) -> list[int]:
+def _check_select_count(n) -> int:
     n = force_integral(n, "items to drop")
     if n < 0:
         raise ValueError(f"Can't drop negative # of items ({n})")
+    return n
+
+
+# Expects `n` already checked by _check_select_count.
+def _select_low_high(setr: SetResult, n: int, high: bool = False) -> list[int]:
     if n == 0:
         # nothing to select
         return []
 
-    # sort and pair with indices
-    sorted_pairs = sorted(
-        setr.get_remaining_enumerated(), key=lambda pair: pair[1], reverse=high
+    # pair remaining items with indices, selecting only the n needed
+    # (nsmallest/nlargest break ties by original order, like a stable sort)
+    pairs = (
+        (i, element.item)
+        for i, element in enumerate(setr.elements)
+        if not element.dropped
     )
+    select = heapq.nlargest if high else heapq.nsmallest
     # gather indices of n elements
-    return [pair[0] for pair in sorted_pairs[:n]]
+    return [pair[0] for pair in select(n, pairs, key=operator.itemgetter(1))]
 
 
 # Set selector. Find all even or odd values in the set.
@@ -481,24 +542,30 @@ class IndexSelector(SetSelector):
 
 
 def invert_selection(all_count: int, selected: list[int]):
-    return [i for i in range(all_count) if i not in selected]
+    selected_set = set(selected)
+    return [i for i in range(all_count) if i not in selected_set]
 
 
-def single_roll(size: int | SpecialDie) -> int:
-    if isinstance(size, SpecialDie):
-        return special_roll(size)
-
-    if size == 0:
-        return 0
-    else:
-        return randint(1, size)
+# Pools at least this large are drawn in bulk by random.choices, which
+# overtakes one randint per die from a handful of dice.
+POOL_BULK_MIN = 4
+# choices() scales a float into the range, which stays effectively unbiased
+# only while the die is much smaller than the 53 bits of float precision.
+POOL_BULK_MAX_SIZE = 2**32
 
 
-def special_roll(die_type: SpecialDie) -> int:
-    if die_type not in SPECIAL_DIE_SIDES:
-        raise ValueError(f"Unknown sides for special die ({die_type})")
-    options = [k for k in SPECIAL_DIE_SIDES[die_type]]
-    return choice(options)
+# Roll `count` dice of the same size.
+# The die type is resolved once for the whole pool rather than once per die.
+def roll_pool(count: int, size: int | SpecialDie) -> list[int]:
+    if isinstance(size, SpecialDie):
+        if size not in SPECIAL_DIE_FACES:
+            raise ValueError(f"Unknown sides for special die ({size})")
+        return choices(SPECIAL_DIE_FACES[size], k=count)
+    if size == 0:
+        return [0] * count
+    if count >= POOL_BULK_MIN and size <= POOL_BULK_MAX_SIZE:
+        return choices(range(1, size + 1), k=count)
+    return [randint(1, size) for _ in range(count)]
 
 
 def dice_roll(count, size: int | SpecialDie):
@@ -511,11 +578,7 @@ def dice_roll(count, size: int | SpecialDie):
             raise ValueError(f"Negative dice don't exist (d{size})")
         size = force_integral(size, "dice size")
 
-    rolls = []
-    for i in range(count):
-        rolls.append(single_roll(size))
-
-    return DiceValues(size, items=rolls)
+    return DiceValues(size, items=roll_pool(count, size))
 
 
 # Set operator.
@@ -551,14 +614,12 @@ def set_op_keep(setr: SetResult, selected: list[int], invert=False):
 # Helper function for dice rerolls.
 # For each index in `should_reroll`, remove the item and roll another die.
 # All new rolled values are appended to the elements, preserving the original indices.
+# Modifies `dice` in place; its value is not kept up to date.
 def _dice_reroll_append(
     dice: DiceValues,
     should_reroll: list[int],
     reroll_bases: dict[int, list[int] | int],
 ):
-    temp_dice = dice.copy()
-    new_rolls = []
-
     appended_index = dice.get_all_count()
     for i in should_reroll:
         base_index: int = i
@@ -571,15 +632,11 @@ def _dice_reroll_append(
             appended_index
         ] = base_index  # point to the base which this reroll descends from
         reroll_bases[base_index].insert(0, appended_index)  # type: ignore
-
-        new_roll = single_roll(dice.get_dice_size())
-        new_rolls.append(new_roll)
         appended_index += 1
 
-    temp_dice.drop_indices(should_reroll)
-    temp_dice.append_items(new_rolls)
-    temp_dice.set_value(temp_dice.total())
-    return temp_dice
+    new_rolls = roll_pool(len(should_reroll), dice.get_dice_size())
+    dice.drop_indices(should_reroll)
+    dice.append_items(new_rolls)
 
 
 # Set operator for dice.
@@ -603,11 +660,14 @@ def dice_reroll(
     # reroll's index -> original index
     # new rolled indices are pushed at the start of the list
     reroll_bases: dict[int, list[int] | int] = {}
+    appended_start = 0
     while rerolls < max_rerolls:
-        should_reroll = selector.apply(temp_dice)
+        # after the first pass, only the dice just rolled can be newly matched
+        should_reroll = selector.apply_appended(temp_dice, appended_start)
         if len(should_reroll) == 0:
             break
-        temp_dice = _dice_reroll_append(temp_dice, should_reroll, reroll_bases)
+        appended_start = temp_dice.get_all_count()
+        _dice_reroll_append(temp_dice, should_reroll, reroll_bases)
         rerolls += 1
 
     result = dice.copy()
@@ -37,6 +37,12 @@ class MathTest(RollTest):
         self.assertFirstRollEquals("fact(5C2)", 3628800)
         self.assertFirstRollEquals("12 P 2", 132)
         self.assertFirstRollEquals("30 permute 5", 17100720)
+        self.assertFirstRollEquals("fact(3.0)", 6)
+        self.assertFirstRollEquals("60 C 30", 118264581564861424)
+        self.assertFirstRollEquals("200 C 199", 200)
+        self.assertFirstRollEquals("3 C 5", 0)
+        self.assertFirstRollEquals("1000 C 999", 1000)
+        self.assertRaises(ValueError, dice.roll, "5 P -1")
 
     def test_comparison(self):
         self.assertFirstRollEquals("10 > 3", True)
@@ -68,6 +74,12 @@ class DiceTest(RollTest):
         dice.roll("10 - 10d4")
         dice.roll("3d((2+23)/5)")
 
+    def test_large_pool(self):
+        rolls = dice_details.roll_pool(1000, 6)
+        self.assertEqual(len(rolls), 1000)
+        self.assertTrue(all(1 <= r <= 6 for r in rolls))
+        self.assertEqual(dice_details.roll_pool(100, 0), [0] * 100)
+
     def test_interpret_dropkeep(self):
         dice.roll("4d6kh3")
         dice.roll("8d12pl3")
@@ -120,6 +132,11 @@ class DiceTest(RollTest):
         dice.roll("repeat(repeat(4*3d8, 2), 3)")
         dice.roll("repeat(3d10, repeat(d8, 4)kh1)pl1")
 
+    def test_repeat_without_dice(self):
+        results = dice.roll("repeat(10 C 5, 4)")
+        self.assertEqual(results[0].detail.get_remaining(), [252] * 4)
+        self.assertFirstRollEquals("agg(repeat(2 * 3, 3), +)", 18)
+
     def test_interpret_aggregate(self):
         dice.roll("agg(10d6, +)")
         dice.roll("agg(10d4, -)")
@@ -140,6 +157,13 @@ class DiceTest(RollTest):
         self.assertFirstRollEquals("{2, 4, 6, 3}keven", 12)
         self.assertFirstRollEquals("{2, 4, 6, 3}podd", 12)
 
+    # A lone nested set totals to itself rather than being added to 0.
+    def test_nested_single_set(self):
+        dice.roll("{{1, 2}}kh1")
+        dice.roll("agg({{1, 2}}, +)")
+        dice.roll("agg({{1, 2}}, *)")
+        dice.roll("repeat({1, 2}, 1)kh1")
+
     def test_explode_once(self):
         dice.roll("10d3!")
         dice.roll("10d3!o")
@@ -200,6 +224,28 @@ class SetTest(unittest.TestCase):
         self.assertListEqual(set_items, self.values)
         self.assertEqual(self.setr.total(), 26)
 
+    def test_remaining_after_changes(self):
+        self.assertListEqual(self.setr.get_remaining(), self.values)
+        self.setr.drop_indices([0, 4])
+        self.assertListEqual(self.setr.get_remaining(), [5, 3, 7, 0, 6])
+        self.setr.append_items([2])
+        self.setr.insert_item(0, 1, dropped=True)
+        self.assertListEqual(self.setr.get_remaining(), [5, 3, 7, 0, 6, 2])
+        self.assertEqual(self.setr.total(), 23)
+        self.setr.drop_indices([1, 1])
+        self.assertEqual(self.setr.get_remaining_count(), 6)
+        self.assertEqual(self.setr.copy().get_remaining_count(), 6)
+
+    def test_copy_drop(self):
+        copied = self.setr.copy()
+        copied.drop_indices([1])
+        self.assertEqual(copied.get_remaining_count(), len(self.values) - 1)
+        self.assertEqual(self.setr.get_remaining_count(), len(self.values))
+
+    def test_total_single_set(self):
+        inner = dice_details.MultiExpr([1, 2])
+        self.assertIs(dice_details.SetResult([inner]).total(), inner)
+
     def test_select_low_high(self):
         select_zero = dice_details._select_low_high(self.setr, 0, high=False)
         self.assertEqual(len(select_zero), 0)
@@ -227,6 +273,11 @@ class SetTest(unittest.TestCase):
         self.assertNotIn(5, select_gt_zero)
         self.assertIn(2, select_gt_zero)
 
+    def test_select_appended(self):
+        selector = dice_details.ConditionalSelector(lambda x: x > 0)
+        self.assertListEqual(selector.apply_appended(self.setr, 0), [0, 1, 2, 3, 6])
+        self.assertListEqual(selector.apply_appended(self.setr, 3), [3, 6])
+
     def test_explode(self):
         # simulated 4d6
         die_size = 6
@@ -266,6 +317,12 @@ class MacroTest(RollTest):
         self.assertFirstRollEquals("$pi", self.my_pi)
         self.assertFirstRollEquals("$pi + $pi", self.my_pi + self.my_pi)
 
+    def test_redefined_macro(self):
+        self.test_macros.add_macro("bonus", "2")
+        self.assertFirstRollEquals("1 + $bonus", 3)
+        self.test_macros.add_macro("bonus", "5")
+        self.assertFirstRollEquals("1 + $bonus", 6)
+
     def test_interpret_stats(self):
         self.assertIsNotNone(self.test_macros.get_macro_content("stats"))
         dice.roll("$stats")